@@ -9,23 +9,82 @@ Usage:
     python serve.py
 """
 
+import collections
+import gzip
+import hashlib
 import http.server
 import json
 import os
-import re
+import queue as queue_mod
 import socket
+import socketserver
 import subprocess
 import threading
 import time
 import urllib.parse
 
+# orjson is optional (pip install orjson); it is several times faster on the poll path.
+# Whatever orjson rejects (1e400, NaN, ints too big to encode) goes through the
+# stdlib instead. Two differences remain: orjson parses integers outside the
+# 64-bit range as floats, and writes NaN/Infinity as null. Relayed msg payloads
+# should therefore keep to 64-bit ints and finite numbers.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
 PORT = 4545
 ROOM_TIMEOUT = 30 * 60
 MSG_TTL = 60
 CLEANUP_INTERVAL = 30
+POLL_HINT_MIN_MS = 250    # suggested poll delay while a room is active
+POLL_HINT_MAX_MS = 5000   # ceiling for the suggested delay once a room goes quiet
+POLL_HINT_IDLE_MS = 2000  # each quiet period of this length doubles the delay
+CLEANUP_QUEUE_LEN = 1000  # wake cleanup early once a queue this long has expired messages
+LONG_POLL_TIMEOUT = 25
+MAX_LONG_POLLS = 64
+SEND_BATCH_WINDOW = 0.02
+MAX_WORKERS = 128  # must stay above MAX_LONG_POLLS so short requests still get a worker
+
+HTML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hidden_word.html")
+
+# Filled once by load_html(); None means the page is missing.
+HTML_BYTES = None
+HTML_GZIP = None
+HTML_ETAG = None
+# (size, mtime) of the page as loaded; None disables sendfile (e.g. on Windows).
+HTML_STAT = None
 
 rooms = {}
 rooms_lock = threading.Lock()
+# Notified to run a cleanup pass before CLEANUP_INTERVAL elapses, or to stop it.
+cleanup_cv = threading.Condition()
+cleanup_stopped = False
+last_growth_cleanup = 0.0
+# Tunnel subprocesses; reaped by the cleanup thread instead of one waiter thread each.
+child_procs = []
+child_procs_lock = threading.Lock()
+# Recycled poll-result dicts; deque append/pop are atomic, so no lock is needed.
+dict_pool = collections.deque(maxlen=1024)
+long_poll_slots = threading.BoundedSemaphore(MAX_LONG_POLLS)
 
 
 def get_local_ip():
@@ -40,30 +99,267 @@ def get_local_ip():
     return ip
 
 
+def prebake(obj, status=200):
+    """Serialize a constant JSON reply, status line and headers included, once."""
+    body = dumps(obj)
+    head = (f"HTTP/1.0 {status} {http.HTTPStatus(status).phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Access-Control-Allow-Methods: POST, GET, OPTIONS\r\n"
+            "Access-Control-Allow-Headers: Content-Type\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n")
+    return status, head.encode("latin-1") + body
+
+
+OK_REPLY = prebake({"ok": True})
+JOINED_REPLY = prebake({"ok": True, "host": False})
+NOT_FOUND_REPLY = prebake({"error": "Not found"}, 404)
+INVALID_JSON_REPLY = prebake({"error": "Invalid JSON"}, 400)
+MISSING_ROOM_OR_NAME_REPLY = prebake({"error": "Missing room or name"}, 400)
+MISSING_FIELDS_REPLY = prebake({"error": "Missing fields"}, 400)
+ROOM_NOT_FOUND_REPLY = prebake({"error": "Room not found"}, 404)
+ROOM_EXISTS_REPLY = prebake({"error": "Room already exists"}, 409)
+
+
+def now_ms():
+    """Monotonic milliseconds; immune to wall-clock jumps and cheaper than time.time()."""
+    return time.monotonic_ns() // 1_000_000
+
+
+def pooled_dict():
+    try:
+        return dict_pool.pop()
+    except IndexError:
+        return {}
+
+
+def load_html():
+    """Read hidden_word.html once and precompute its gzip body and ETag."""
+    global HTML_BYTES, HTML_GZIP, HTML_ETAG, HTML_STAT
+    try:
+        with open(HTML_PATH, "rb") as f:
+            content = f.read()
+            if hasattr(os, "sendfile"):
+                HTML_STAT = file_stat(f)
+    except FileNotFoundError:
+        return
+    HTML_BYTES = content
+    HTML_GZIP = gzip.compress(content)
+    HTML_ETAG = '"%s"' % hashlib.md5(content).hexdigest()
+
+
+def accepts_gzip(header):
+    """True if an Accept-Encoding header allows gzip, explicitly or via *, with q > 0."""
+    wildcard = False
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding == "gzip":
+            return q > 0
+        if coding == "*":
+            wildcard = q > 0
+    return wildcard
+
+
+def file_stat(f):
+    st = os.fstat(f.fileno())
+    return st.st_size, st.st_mtime_ns
+
+
+def get_room(room_code):
+    """Resolve a room under the top-level lock; callers then take room["lock"].
+
+    Lock order is always rooms_lock -> room["lock"]. A room removed while a
+    handler waits for its lock is marked "closed" and must be treated as gone.
+    """
+    with rooms_lock:
+        return rooms.get(room_code)
+
+
+def is_expired(room, now):
+    # max() walks the values in C, so it is safe against poll's unlocked last-seen writes.
+    return (now - room["created"] > ROOM_TIMEOUT
+            and now - max(room["players"].values(), default=0) > ROOM_TIMEOUT)
+
+
+def poll_hint(room):
+    """Suggested client delay before the next short poll, backing off while the room is quiet."""
+    idle_ms = now_ms() - room["last_activity_ms"]
+    if idle_ms < POLL_HINT_IDLE_MS:
+        return POLL_HINT_MIN_MS
+    steps = min(idle_ms // POLL_HINT_IDLE_MS, 5)
+    return min(POLL_HINT_MAX_MS, POLL_HINT_MIN_MS << steps)
+
+
+def collect_messages(queue, since):
+    """Build poll entries for queue messages newer than since; caller holds the room lock."""
+    # Queues are ordered by ts, so walk back from the newest entry and stop at
+    # the first one already seen: O(new messages), never touching the backlog.
+    result = []
+    for ts, frm, to, msg in reversed(queue):
+        if ts <= since:
+            break
+        d = pooled_dict()
+        d["ts"] = ts
+        d["from"] = frm
+        d["to"] = to
+        d["msg"] = msg
+        result.append(d)
+    result.reverse()
+    return result
+
+
+def drain(room, name, since, prev_event=None):
+    """Collect a player's unseen messages under the room lock.
+
+    Returns (result, max_ts, event), or None if the room has been closed. The
+    player's event is cleared first, so a send after this point wakes a long poll.
+    A long poll passes the event it waited on as prev_event; if that event is no
+    longer the player's, they left meanwhile and ([], max_ts, None) is returned
+    without re-creating their queue.
+    """
+    with room["lock"]:
+        if room["closed"]:
+            return None
+        if prev_event is not None and room["events"].get(name) is not prev_event:
+            return [], max(since, room["last_ts"]), None
+        queue = room["queues"].setdefault(name, collections.deque())
+        event = room["events"].setdefault(name, threading.Event())
+        event.clear()
+        return collect_messages(queue, since), max(since, room["last_ts"]), event
+
+
+def flush_room(room):
+    """Deliver a room's pending sends in one locked pass with one wake per recipient."""
+    with room["pending_lock"]:
+        pending, room["pending"] = room["pending"], []
+        room["flush_timer"] = None
+    if not pending:
+        return
+    woken = set()
+    batch_ms = now_ms()
+    with room["lock"]:
+        room["last_activity_ms"] = batch_ms
+        queues = room["queues"]
+        for from_name, to_name, msg in pending:
+            # Keep timestamps strictly increasing so poll can stop at the first seen one.
+            ts = max(batch_ms, room["last_ts"] + 1)
+            room["last_ts"] = ts
+            entry = (ts, from_name, to_name, msg)
+            # One bad entry must not lose the rest of the batch or its wake-ups.
+            try:
+                # Fan out at write time so poll only drains its own queue.
+                if to_name == "*":
+                    for player, queue in queues.items():
+                        if player != from_name:
+                            queue.append(entry)
+                            woken.add(player)
+                elif to_name in room["players"]:
+                    # Unknown names get no queue, so made-up recipients can't grow
+                    # the room; drain() creates the queue once that player polls.
+                    queues.setdefault(to_name, collections.deque()).append(entry)
+                    woken.add(to_name)
+            except Exception as e:
+                print(f"  [!] Dropped message from {from_name!r}: {e}")
+        for player in woken:
+            room["events"].setdefault(player, threading.Event()).set()
+        # Only worth an early pass if there is something to trim: a long queue
+        # of still-live messages would otherwise wake cleanup on every flush.
+        cutoff = batch_ms - MSG_TTL * 1000
+        grown = any(len(queue) > CLEANUP_QUEUE_LEN and queue[0][0] <= cutoff
+                    for queue in queues.values())
+    if grown:
+        request_growth_cleanup()
+
+
+def request_cleanup():
+    with cleanup_cv:
+        cleanup_cv.notify()
+
+
+def request_growth_cleanup():
+    """Wake cleanup for an oversized queue, at most once per MSG_TTL."""
+    global last_growth_cleanup
+    now = time.monotonic()
+    if now - last_growth_cleanup >= MSG_TTL:
+        last_growth_cleanup = now
+        request_cleanup()
+
+
+def stop_cleanup():
+    global cleanup_stopped
+    with cleanup_cv:
+        cleanup_stopped = True
+        cleanup_cv.notify()
+
+
+def reap_children():
+    """Collect exited child processes without blocking (Popen.poll is waitpid WNOHANG)."""
+    with child_procs_lock:
+        child_procs[:] = [proc for proc in child_procs if proc.poll() is None]
+
+
 def cleanup_rooms():
     while True:
-        time.sleep(CLEANUP_INTERVAL)
-        now = time.time()
+        with cleanup_cv:
+            if not cleanup_stopped:
+                cleanup_cv.wait(timeout=CLEANUP_INTERVAL)
+            if cleanup_stopped:
+                return
+        reap_children()
+        now = time.monotonic()
+        cutoff = now_ms() - MSG_TTL * 1000
         with rooms_lock:
-            dead = [code for code, room in rooms.items()
-                    if now - room["created"] > ROOM_TIMEOUT
-                    and all(now - t > ROOM_TIMEOUT for t in room["players"].values())]
-            for code in dead:
-                del rooms[code]
-            for room in rooms.values():
-                cutoff = (now - MSG_TTL) * 1000
-                room["msgs"] = [m for m in room["msgs"] if m[0] > cutoff]
+            snapshot = list(rooms.items())
+        dead = []
+        for code, room in snapshot:
+            with room["lock"]:
+                if is_expired(room, now):
+                    dead.append((code, room))
+                    continue
+                # Players gone quiet without leaving stop receiving broadcasts;
+                # their queue and event come back if they poll again.
+                for name, seen in room["players"].items():
+                    if now - seen > ROOM_TIMEOUT and name in room["queues"]:
+                        del room["queues"][name]
+                        room["events"].pop(name, threading.Event()).set()
+                # Queues are ordered by ts, so expired messages sit at the head.
+                for queue in room["queues"].values():
+                    while queue and queue[0][0] <= cutoff:
+                        queue.popleft()
+        for code, room in dead:
+            with rooms_lock, room["lock"]:
+                # Re-check: a player may have rejoined since the snapshot.
+                if rooms.get(code) is room and is_expired(room, now):
+                    room["closed"] = True
+                    del rooms[code]
+                    for event in room["events"].values():
+                        event.set()
 
 
 class Handler(http.server.SimpleHTTPRequestHandler):
 
+    # Replies are tiny; don't let Nagle hold them back waiting for an ACK.
+    disable_nagle_algorithm = True
+    # Drop idle connections (e.g. browser preconnects) so they can't pin a worker.
+    timeout = 30
+
     def log_message(self, format, *args):
         msg = format % args
         if "/api/" in msg:
             print(f"  {msg}")
 
     def send_json(self, obj, status=200):
-        body = json.dumps(obj).encode("utf-8")
+        body = dumps(obj)
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Access-Control-Allow-Origin", "*")
@@ -73,6 +369,14 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(body)
 
+    def send_prebaked(self, reply):
+        status, data = reply
+        self.log_request(status)
+        self.wfile.write(data)
+
+    def send_ok(self):
+        self.send_prebaked(OK_REPLY)
+
     def do_OPTIONS(self):
         self.send_response(204)
         self.send_header("Access-Control-Allow-Origin", "*")
@@ -85,127 +389,300 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         path = parsed.path
 
         if path == "/" or path == "/index.html":
-            html_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hidden_word.html")
-            try:
-                with open(html_path, "rb") as f:
-                    content = f.read()
-                self.send_response(200)
-                self.send_header("Content-Type", "text/html; charset=utf-8")
-                self.send_header("Content-Length", str(len(content)))
-                self.send_header("Access-Control-Allow-Origin", "*")
+            if HTML_BYTES is None:
+                self.send_json({"error": "hidden_word.html not found"}, 404)
+                return
+            if self.headers.get("If-None-Match") == HTML_ETAG:
+                self.send_response(304)
+                self.send_header("ETag", HTML_ETAG)
                 self.end_headers()
+                return
+            use_gzip = accepts_gzip(self.headers.get("Accept-Encoding", ""))
+            content = HTML_GZIP if use_gzip else HTML_BYTES
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            if use_gzip:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(content)))
+            self.send_header("ETag", HTML_ETAG)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            if use_gzip or not self.sendfile_html():
                 self.wfile.write(content)
-            except FileNotFoundError:
-                self.send_json({"error": "hidden_word.html not found"}, 404)
         else:
             super().do_GET()
 
+    def sendfile_html(self):
+        """Copy the page straight from the file to the socket; False if the caller must write it."""
+        if HTML_STAT is None:
+            return False
+        try:
+            f = open(HTML_PATH, "rb")
+        except OSError:
+            return False
+        with f:
+            # The cached headers describe the file as loaded; if it changed on
+            # disk since, fall back to the in-memory copy.
+            if file_stat(f) != HTML_STAT:
+                return False
+            self.wfile.flush()
+            # socket.sendfile waits out EAGAIN on our timeout socket and loops
+            # over partial sends; it stops short only if the file shrank.
+            sent = self.connection.sendfile(f, 0, len(HTML_BYTES))
+        if sent < len(HTML_BYTES):
+            self.wfile.write(HTML_BYTES[sent:])
+        return True
+
     def do_POST(self):
         if self.path != "/api/room":
-            self.send_json({"error": "Not found"}, 404)
+            self.send_prebaked(NOT_FOUND_REPLY)
             return
 
         try:
             length = int(self.headers.get("Content-Length", 0))
-            body = json.loads(self.rfile.read(length)) if length else {}
+            body = loads(self.rfile.read(length)) if length else {}
         except (json.JSONDecodeError, ValueError):
-            self.send_json({"error": "Invalid JSON"}, 400)
+            self.send_prebaked(INVALID_JSON_REPLY)
             return
 
         action = body.get("action", "")
-        room_code = body.get("room", "").upper()
+        handler = ACTIONS.get(action) if isinstance(action, str) else None
+        if handler is None:
+            self.send_json({"error": f"Unknown action: {action}"}, 400)
+            return
+        handler(self, body.get("room", "").upper(), body)
 
-        if action == "create":
-            name = body.get("name", "").strip()
-            if not room_code or not name:
-                self.send_json({"error": "Missing room or name"}, 400)
-                return
-            with rooms_lock:
-                if room_code in rooms:
-                    self.send_json({"error": "Room already exists"}, 409)
-                    return
-                rooms[room_code] = {
-                    "players": {name: time.time()},
-                    "host": name,
-                    "msgs": [],
-                    "created": time.time(),
-                }
-            print(f"  [ROOM] Created: {room_code} by {name}")
-            self.send_json({"ok": True})
-
-        elif action == "join":
-            name = body.get("name", "").strip()
-            if not room_code or not name:
-                self.send_json({"error": "Missing room or name"}, 400)
+    def _create(self, room_code, body):
+        name = body.get("name", "").strip()
+        if not room_code or not name:
+            self.send_prebaked(MISSING_ROOM_OR_NAME_REPLY)
+            return
+        with rooms_lock:
+            if room_code in rooms:
+                self.send_prebaked(ROOM_EXISTS_REPLY)
                 return
-            with rooms_lock:
-                if room_code not in rooms:
-                    self.send_json({"error": "Room not found"}, 404)
-                    return
-                room = rooms[room_code]
-                room["players"][name] = time.time()
-            print(f"  [ROOM] {name} joined {room_code}")
-            self.send_json({"ok": True, "host": False})
-
-        elif action == "send":
-            from_name = body.get("from", "").strip()
-            to_name = body.get("to", "")
-            msg = body.get("msg", {})
-            if not room_code or not from_name:
-                self.send_json({"error": "Missing fields"}, 400)
+            rooms[room_code] = {
+                "players": {name: time.monotonic()},
+                "host": name,
+                "queues": {name: collections.deque()},
+                "events": {name: threading.Event()},
+                "pending": [],
+                "pending_lock": threading.Lock(),
+                "flush_timer": None,
+                "last_ts": 0,
+                "last_activity_ms": now_ms(),
+                "created": time.monotonic(),
+                "closed": False,
+                "lock": threading.Lock(),
+            }
+        print(f"  [ROOM] Created: {room_code} by {name}")
+        self.send_ok()
+
+    def _join(self, room_code, body):
+        name = body.get("name", "").strip()
+        if not room_code or not name:
+            self.send_prebaked(MISSING_ROOM_OR_NAME_REPLY)
+            return
+        room = get_room(room_code)
+        if room is None:
+            self.send_prebaked(ROOM_NOT_FOUND_REPLY)
+            return
+        with room["lock"]:
+            if room["closed"]:
+                self.send_prebaked(ROOM_NOT_FOUND_REPLY)
                 return
-            now_ms = int(time.time() * 1000)
-            with rooms_lock:
-                if room_code not in rooms:
-                    self.send_json({"error": "Room not found"}, 404)
-                    return
-                room = rooms[room_code]
-                if to_name == "__HOST__":
-                    to_name = room["host"]
-                room["msgs"].append((now_ms, from_name, to_name, msg))
-            self.send_json({"ok": True})
-
-        elif action == "poll":
-            name = body.get("name", "").strip()
-            since = body.get("since", 0)
-            if not room_code or not name:
-                self.send_json({"error": "Missing fields"}, 400)
+            room["players"][name] = time.monotonic()
+            room["queues"].setdefault(name, collections.deque())
+            room["events"].setdefault(name, threading.Event())
+        print(f"  [ROOM] {name} joined {room_code}")
+        self.send_prebaked(JOINED_REPLY)
+
+    def _send(self, room_code, body):
+        from_name = body.get("from", "")
+        to_name = body.get("to", "")
+        msg = body.get("msg", {})
+        # Names become dict keys in flush_room, so only strings are accepted.
+        if not isinstance(from_name, str) or not isinstance(to_name, str):
+            self.send_prebaked(MISSING_FIELDS_REPLY)
+            return
+        from_name = from_name.strip()
+        if not room_code or not from_name:
+            self.send_prebaked(MISSING_FIELDS_REPLY)
+            return
+        room = get_room(room_code)
+        if room is None:
+            self.send_prebaked(ROOM_NOT_FOUND_REPLY)
+            return
+        if room["closed"]:
+            self.send_prebaked(ROOM_NOT_FOUND_REPLY)
+            return
+        if to_name == "__HOST__":
+            to_name = room["host"]
+        # Coalesce bursts: sends queue up here and flush_room delivers them
+        # together after a short window that grows with the player count.
+        with room["pending_lock"]:
+            room["pending"].append((from_name, to_name, msg))
+            if room["flush_timer"] is None:
+                window = min(SEND_BATCH_WINDOW, 0.005 * len(room["players"]))
+                timer = threading.Timer(window, flush_room, args=(room,))
+                timer.daemon = True
+                room["flush_timer"] = timer
+                timer.start()
+        self.send_ok()
+
+    def _poll(self, room_code, body):
+        name = body.get("name", "").strip()
+        since = body.get("since", 0)
+        if not room_code or not name:
+            self.send_prebaked(MISSING_FIELDS_REPLY)
+            return
+        room = get_room(room_code)
+        if room is None:
+            self.send_prebaked(ROOM_NOT_FOUND_REPLY)
+            return
+        # Refreshing last-seen is a single GIL-atomic dict store, so it stays
+        # outside the room lock; only a first-time name needs the lock.
+        players = room["players"]
+        if name in players:
+            players[name] = time.monotonic()
+        else:
+            with room["lock"]:
+                players[name] = time.monotonic()
+        # Parking a long poll would stall a single-threaded server entirely.
+        if not (body.get("long", False) and isinstance(self.server, socketserver.ThreadingMixIn)):
+            # Short poll, the dominant request: one locked pass, with no semaphore,
+            # deadline or retry loop.
+            drained = drain(room, name, since)
+            if drained is None:
+                self.send_prebaked(ROOM_NOT_FOUND_REPLY)
                 return
-            with rooms_lock:
-                if room_code not in rooms:
-                    self.send_json({"error": "Room not found"}, 404)
+            result, max_ts, _ = drained
+            self.send_poll(result, max_ts, poll_hint(room))
+            return
+        # Long polls park on the player's event until send() sets it; the
+        # semaphore caps how many handler threads may be parked at once.
+        waiting = long_poll_slots.acquire(blocking=False)
+        try:
+            deadline = time.monotonic() + LONG_POLL_TIMEOUT
+            event = None
+            while True:
+                drained = drain(room, name, since, event)
+                if drained is None:
+                    self.send_prebaked(ROOM_NOT_FOUND_REPLY)
                     return
-                room = rooms[room_code]
-                room["players"][name] = time.time()
-                result = []
-                max_ts = since
-                for ts, frm, to, msg in room["msgs"]:
-                    if ts <= since:
-                        continue
-                    if to == "*" or to == name:
-                        if frm == name and to == "*":
-                            continue
-                        result.append({"ts": ts, "from": frm, "to": to, "msg": msg})
-                    if ts > max_ts:
-                        max_ts = ts
-            self.send_json({"ok": True, "msgs": result, "ts": max_ts})
-
-        elif action == "leave":
-            name = body.get("name", "").strip()
-            if not room_code or not name:
-                self.send_json({"error": "Missing fields"}, 400)
-                return
-            with rooms_lock:
-                if room_code in rooms:
-                    room = rooms[room_code]
-                    room["players"].pop(name, None)
-                    if not room["players"]:
+                result, max_ts, event = drained
+                remaining = deadline - time.monotonic()
+                if event is None or result or not waiting or remaining <= 0:
+                    break  # event is None: the player left while we were waiting
+                event.wait(remaining)
+        finally:
+            if waiting:
+                long_poll_slots.release()
+        # No nextPollMs here: a long-polling client should re-park at once.
+        self.send_poll(result, max_ts)
+
+    def send_poll(self, result, max_ts, hint=None):
+        reply = {"ok": True, "msgs": result, "ts": max_ts}
+        if hint is not None:
+            reply["nextPollMs"] = hint
+        try:
+            self.send_json(reply)
+        finally:
+            # send_json has fully serialized the dicts, so they can be reused.
+            for d in result:
+                d.clear()
+                dict_pool.append(d)
+
+    def _leave(self, room_code, body):
+        name = body.get("name", "").strip()
+        if not room_code or not name:
+            self.send_prebaked(MISSING_FIELDS_REPLY)
+            return
+        room = get_room(room_code)
+        if room is not None:
+            with room["lock"]:
+                room["players"].pop(name, None)
+                room["queues"].pop(name, None)
+                event = room["events"].pop(name, None)
+                if event:
+                    event.set()
+                empty = not room["players"]
+            if empty:
+                with rooms_lock, room["lock"]:
+                    if rooms.get(room_code) is room and not room["players"]:
+                        room["closed"] = True
                         del rooms[room_code]
+                        for event in room["events"].values():
+                            event.set()
                         print(f"  [ROOM] Deleted empty room: {room_code}")
-            self.send_json({"ok": True})
+                request_cleanup()
+        self.send_ok()
 
-        else:
-            self.send_json({"error": f"Unknown action: {action}"}, 400)
+
+ACTIONS = {
+    "create": Handler._create,
+    "join": Handler._join,
+    "send": Handler._send,
+    "poll": Handler._poll,
+    "leave": Handler._leave,
+}
+
+
+class GameServer(http.server.ThreadingHTTPServer):
+    """Threaded HTTP server that runs requests on a bounded pool of daemon workers."""
+
+    request_queue_size = 128  # every poll is a new connection, so bursts are common
+    # SO_REUSEPORT lets several worker processes share the port, but it also hides
+    # the "port already in use" error main() relies on, so it is opt-in.
+    allow_reuse_port = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Daemon threads rather than a ThreadPoolExecutor, whose workers are
+        # joined at interpreter exit and would hang Ctrl+C on a stuck request.
+        self.pending_requests = queue_mod.SimpleQueue()
+        for i in range(MAX_WORKERS):
+            threading.Thread(target=self.serve_requests, name=f"http-{i}", daemon=True).start()
+
+    def serve_requests(self):
+        while True:
+            item = self.pending_requests.get()
+            if item is None:
+                return
+            self.process_request_thread(*item)
+
+    def process_request(self, request, client_address):
+        self.pending_requests.put((request, client_address))
+
+    def server_close(self):
+        super().server_close()
+        # Release parked long polls so the workers can finish.
+        with rooms_lock:
+            for room in rooms.values():
+                with room["lock"]:
+                    room["closed"] = True
+                    for event in room["events"].values():
+                        event.set()
+            rooms.clear()
+        for _ in range(MAX_WORKERS):
+            self.pending_requests.put(None)
+
+
+def find_tunnel_url(line):
+    """Return the first http(s)://....lhr.life URL in an ssh output line, or None."""
+    i = line.find("http")
+    while i >= 0:
+        url = line[i:].split(None, 1)[0]
+        if url.startswith(("https://", "http://")):
+            host = url.split("://", 1)[1]
+            j = host.find(".lhr.life")
+            sub = host[:j]
+            if j > 0 and sub.isascii() and sub.isalnum() and sub == sub.lower():
+                return url
+        i = line.find("http", i + 4)
+    return None
 
 
 def start_tunnel(port):
@@ -226,13 +703,13 @@ def start_tunnel(port):
             line = proc.stdout.readline()
             if not line:
                 break
-            match = re.search(r'(https?://[a-z0-9]+\.lhr\.life\S*)', line)
-            if match:
-                public_url = match.group(1).rstrip()
+            public_url = find_tunnel_url(line)
+            if public_url:
                 break
         if public_url:
-            # Keep SSH process alive in background
-            threading.Thread(target=lambda: proc.wait(), daemon=True).start()
+            # Keep SSH process alive in background; cleanup_rooms reaps it on exit
+            with child_procs_lock:
+                child_procs.append(proc)
             return public_url, proc
     except FileNotFoundError:
         pass
@@ -252,6 +729,7 @@ def start_tunnel(port):
 
 def main():
     ip = get_local_ip()
+    load_html()
 
     # Start cleanup thread
     cleaner = threading.Thread(target=cleanup_rooms, daemon=True)
@@ -268,7 +746,7 @@ def main():
 
     # Start HTTP server in a thread so tunnel can start in parallel
     try:
-        server = http.server.HTTPServer(("0.0.0.0", PORT), Handler)
+        server = GameServer(("0.0.0.0", PORT), Handler)
     except OSError as e:
         print(f"   ERROR: Port {PORT} is already in use.")
         print(f"   Close the other server or change PORT in serve.py.")
@@ -303,6 +781,8 @@ def main():
     except KeyboardInterrupt:
         print("\n   Server stopped.")
         server.shutdown()
+        server.server_close()
+        stop_cleanup()
         if tunnel_proc:
             tunnel_proc.terminate()
 